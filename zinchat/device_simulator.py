@@ -9,13 +9,49 @@ minimal and deterministic for demonstration purposes.
 The ``DeviceSimulator.handle_command`` class method takes a command
 string (with an optional ``/device`` prefix) and produces a textual
 response describing what the device has done or any error message.
+``DeviceSimulator.handle_command_normalised`` does the same for a
+command whose prefix has already been removed by the caller.
+
+The module is fully annotated so that it can optionally be compiled
+to a C extension with mypyc (``mypyc zinchat/device_simulator.py``).
+The compiled module is imported in place of this file when present;
+otherwise this source runs unchanged.
 
 """
 
 from __future__ import annotations
 
 import random
-from typing import Any
+from typing import Callable, Dict, Final
+
+# Prefix identifying chat messages addressed to the device
+COMMAND_PREFIX: Final = "/device"
+COMMAND_PREFIX_LEN: Final = len(COMMAND_PREFIX)
+
+# Dedicated generator for simulated readings, bound once to skip the
+# module attribute lookups on every call
+_RNG: Final = random.Random()
+_randint: Final = _RNG.randint
+
+
+def _status() -> str:
+    return f"Current sensor reading is {_randint(0, 100)}."
+
+
+def _start() -> str:
+    return "Device has been started."
+
+
+def _stop() -> str:
+    return "Device has been stopped."
+
+
+# Recognised commands mapped to functions producing their response
+_HANDLERS: Final[Dict[str, Callable[[], str]]] = {
+    "status": _status,
+    "start": _start,
+    "stop": _stop,
+}
 
 
 class DeviceSimulator:
@@ -44,20 +80,32 @@ class DeviceSimulator:
             command.  Unknown commands will result in an error message.
         """
         # Normalise and strip any prefix
-        cmd = command.strip()
-        if cmd.lower().startswith("/device"):
-            cmd = cmd[len("/device"):]
-        cmd = cmd.strip().lower()
+        cmd = command.strip().lower()
+        if cmd.startswith(COMMAND_PREFIX):
+            cmd = cmd[COMMAND_PREFIX_LEN:].strip()
+        return DeviceSimulator.handle_command_normalised(cmd)
+
+    @staticmethod
+    def handle_command_normalised(cmd: str) -> str:
+        """Return the response for an already normalised command.
+
+        Parameters
+        ----------
+        cmd:
+            The command name with the ``/device`` prefix and any
+            surrounding whitespace removed, in lower case.  Callers
+            that have already parsed the prefix use this to avoid
+            normalising the message a second time.
 
+        Returns
+        -------
+        str
+            A human‑readable response, as for ``handle_command``.
+        """
         # Dispatch based on recognised commands
-        if cmd == "status":
-            value = random.randint(0, 100)
-            return f"Current sensor reading is {value}."
-        elif cmd == "start":
-            return "Device has been started."
-        elif cmd == "stop":
-            return "Device has been stopped."
-        elif not cmd:
+        handler = _HANDLERS.get(cmd)
+        if handler is not None:
+            return handler()
+        if not cmd:
             return "No command provided. Try '/device status'."
-        else:
-            return f"Unknown device command: '{cmd}'."
+        return f"Unknown device command: '{cmd}'."
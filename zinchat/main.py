@@ -10,45 +10,221 @@ exchange text messages.  The server supports two primary use cases:
   prefix are routed to a simple device simulator; the simulator
   returns a response that is sent only to the issuing client.
 
-Additionally, a background task runs on startup to periodically send
+Additionally, background tasks run on startup to periodically send
 simulated sensor readings from the device back to all connected
-clients.  This demonstrates how data flowing from IoT devices can
-appear seamlessly within the same conversational interface.
+clients, batched into JSON frames.  This demonstrates how data
+flowing from IoT devices can appear seamlessly within the same
+conversational interface.
+
+Chat messages are also published through a ``broadcaster`` channel
+(set ``ZINCHAT_BROADCAST_URL`` to a Redis or Postgres URL) so that
+clients connected to other Uvicorn workers receive them too.  Each
+worker simulates its own device, so sensor readings stay local to the
+worker that produced them.
 
 To run the server locally:
 
     uvicorn zinchat.main:app --reload --port 8000
 
+or with the bundled launcher, which insists on a WebSocket
+implementation that supports compression:
+
+    python -m zinchat.main
+
 Then browse to http://localhost:8000/ to open the basic web client.
 """
 
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
 import random
-from typing import List
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Union
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from broadcaster import Broadcast
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, Response
 
-from .device_simulator import DeviceSimulator
+from .device_simulator import (
+    COMMAND_PREFIX,
+    COMMAND_PREFIX_LEN,
+    DeviceSimulator,
+)
+from .registry import ClientRegistry
 
-app = FastAPI(title="ZinChat Demo")
+# JSON helpers backed by orjson when it is installed, else the stdlib
+try:
+    import orjson  # type: ignore[import-not-found, unused-ignore]
+except ImportError:  # pragma: no cover - depends on the environment
 
-# Store connected client WebSocket references
-connected_clients: List[WebSocket] = []
+    def _dumps(obj: Any) -> str:
+        """Serialise ``obj`` to compact JSON text."""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
 
+    def _loads(data: Union[str, bytes]) -> Any:
+        """Parse JSON text produced by ``_dumps``."""
+        return json.loads(data)
 
-@app.get("/")
-def root() -> HTMLResponse:
-    """Serve a simple HTML client for demonstration purposes.
+else:
 
-    This function returns a minimal webpage containing a text area
-    displaying chat messages, an input box, and a button to send
-    messages.  It connects to the WebSocket endpoint at ``/ws`` and
-    streams incoming messages to the page.
+    def _dumps(obj: Any) -> str:
+        """Serialise ``obj`` to compact JSON text."""
+        return orjson.dumps(obj).decode("utf-8")
+
+    def _loads(data: Union[str, bytes]) -> Any:
+        """Parse JSON text produced by ``_dumps``."""
+        return orjson.loads(data)
+
+logger = logging.getLogger(__name__)
+
+
+def _log_task_failure(task: asyncio.Task[None]) -> None:
+    """Log the exception of a background task that stopped by failing."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Background task %s failed",
+            task.get_name(),
+            exc_info=task.exception(),
+        )
+
+
+def _listener_task(backend: Broadcast) -> Optional[asyncio.Task[None]]:
+    """Return the task in which ``backend`` reads published events."""
+    # broadcaster does not expose this task publicly; it only exists
+    # once the backend has been connected
+    task: Optional[asyncio.Task[None]]
+    task = getattr(backend, "_listener_task", None)
+    return task
+
+
+def _watch_listener(backend: Broadcast) -> None:
+    """Log when ``backend`` stops receiving published events.
+
+    broadcaster feeds every subscription from a single listener task.
+    If the connection to the backend is lost, that task dies and
+    subscribers simply stop receiving, so ``_relay`` cannot notice.
+    There is no reconnection; the failure is logged and reported by
+    ``/healthz`` so the worker can be restarted.
+    """
+    task = _listener_task(backend)
+    if task is None:
+        return
+
+    def log_failure(task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Pub/sub listener stopped; chat from other workers is no "
+                "longer relayed",
+                exc_info=task.exception(),
+            )
+
+    task.add_done_callback(log_failure)
+
+
+def _pubsub_state() -> str:
+    """Describe the pub/sub connection for ``/healthz``."""
+    if broadcast is None:
+        return "disabled"
+    task = _listener_task(broadcast)
+    if task is None or task.done():
+        return "disconnected"
+    return "connected"
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Run the pub/sub connection and background tasks with the server.
+
+    On startup this connects to the pub/sub backend, if one is
+    configured, and starts the relay for chat published by other
+    workers.  It also starts the periodic sensor readings with their
+    batched broadcast.  On shutdown the tasks are cancelled and awaited
+    before the backend is disconnected, so nothing outlives the
+    application across reloads.
     """
-    html_content = """
+    # Connect before starting any task, so a backend that is down at
+    # startup cannot leave tasks running with nothing to cancel them
+    if broadcast is not None:
+        await broadcast.connect()
+        _watch_listener(broadcast)
+    sensor_events: asyncio.Queue[int] = asyncio.Queue()
+    tasks = [
+        # Periodic sensor readings and their batched broadcast
+        asyncio.create_task(device_sensor_readings(sensor_events)),
+        asyncio.create_task(device_sensor_broadcast(sensor_events)),
+    ]
+    if broadcast is not None:
+        # Relay messages published by other workers to this worker's clients
+        tasks.append(asyncio.create_task(_relay(broadcast, _CHAT_CHANNEL)))
+    for task in tasks:
+        task.add_done_callback(_log_task_failure)
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if broadcast is not None:
+            # disconnect() re-raises the error of a listener that died,
+            # which has already been logged by _watch_listener
+            try:
+                await broadcast.disconnect()
+            except Exception:
+                logger.warning("Error while disconnecting the pub/sub backend")
+
+
+app = FastAPI(title="ZinChat Demo", lifespan=lifespan)
+
+# Maximum number of simultaneous WebSocket clients
+MAX_CLIENTS = int(os.getenv("ZINCHAT_MAX_CLIENTS", "500"))
+
+# Seconds a client may take to accept one message before it is dropped
+SEND_TIMEOUT = float(os.getenv("ZINCHAT_SEND_TIMEOUT", "2.0"))
+
+# Close code sent when the server is at capacity (try again later)
+SERVER_FULL_CLOSE_CODE = 1013
+
+# Seconds between simulated sensor readings
+SENSOR_INTERVAL = 10.0
+
+# Seconds over which sensor readings are coalesced into one broadcast
+SENSOR_BATCH_WINDOW = 0.1
+
+# Connected clients and their outgoing message queues
+registry = ClientRegistry(send_timeout=SEND_TIMEOUT)
+
+# Pub/sub backend shared by all workers.  Without one, chat is only
+# delivered within this process and nothing is published.
+_BROADCAST_URL = os.getenv("ZINCHAT_BROADCAST_URL")
+broadcast = Broadcast(_BROADCAST_URL) if _BROADCAST_URL else None
+
+# Identifies messages this worker published so it does not relay them
+# back to its own clients a second time
+_WORKER_ID = uuid.uuid4().hex
+
+# Channel name is namespaced so that other applications sharing the
+# same backend do not collide with ZinChat's traffic
+_CHAT_CHANNEL = "zinchat:chat"
+
+# First character of the device command prefix, for a cheap pre-check
+_COMMAND_LEAD = COMMAND_PREFIX[0]
+
+# Prefixes marking the origin of each chat line
+_DEVICE_PREFIX = "Device ➤ "
+_USER_PREFIX = "User ➤ "
+
+# Dedicated generator for simulated sensor readings
+_randint = random.Random().randint
+
+
+# The demo web client never changes at runtime, so its response is
+# encoded and built once at import time and shared by every request
+_INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -76,11 +252,22 @@ def root() -> HTMLResponse:
             const button = document.getElementById('sendButton');
             const wsUrl = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws';
             const socket = new WebSocket(wsUrl);
-            socket.onmessage = function(event) {
+            function appendMessage(text) {
                 const msgElem = document.createElement('div');
-                msgElem.textContent = event.data;
+                msgElem.textContent = text;
                 chatDiv.appendChild(msgElem);
                 chatDiv.scrollTop = chatDiv.scrollHeight;
+            }
+            socket.onmessage = function(event) {
+                // Sensor batches arrive as JSON, chat lines as plain text
+                if (event.data.startsWith('{')) {
+                    const batch = JSON.parse(event.data);
+                    for (const value of batch.sensors) {
+                        appendMessage('Sensor reading: ' + value);
+                    }
+                } else {
+                    appendMessage(event.data);
+                }
             };
             button.onclick = function() {
                 const text = input.value.trim();
@@ -100,66 +287,221 @@ def root() -> HTMLResponse:
     </body>
     </html>
     """
-    return HTMLResponse(html_content)
+_INDEX_HTML_BYTES = _INDEX_HTML.encode("utf-8")
+_INDEX_DIGEST = hashlib.md5(_INDEX_HTML_BYTES, usedforsecurity=False)
+_INDEX_ETAG = f'"{_INDEX_DIGEST.hexdigest()}"'
+_INDEX_HEADERS = {"ETag": _INDEX_ETAG, "Cache-Control": "public, max-age=3600"}
+_INDEX_RESPONSE = HTMLResponse(_INDEX_HTML_BYTES, headers=_INDEX_HEADERS)
+_INDEX_NOT_MODIFIED = Response(status_code=304, headers=_INDEX_HEADERS)
+
+
+def _etag_matches(if_none_match: Optional[str]) -> bool:
+    """Return whether an ``If-None-Match`` header matches the page."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        # If-None-Match uses weak comparison, so W/ tags match as well
+        if tag == "*" or tag.removeprefix("W/") == _INDEX_ETAG:
+            return True
+    return False
+
+
+@app.get("/")
+def root(request: Request) -> Response:
+    """Serve a simple HTML client for demonstration purposes.
+
+    This function returns a minimal webpage containing a text area
+    displaying chat messages, an input box, and a button to send
+    messages.  It connects to the WebSocket endpoint at ``/ws`` and
+    streams incoming messages to the page.  The page is pre-rendered
+    at import time, so each request reuses the same response.  It
+    carries a strong ``ETag``, and browsers revalidating a cached copy
+    receive an empty ``304 Not Modified`` instead.
+    """
+    if _etag_matches(request.headers.get("if-none-match")):
+        return _INDEX_NOT_MODIFIED
+    return _INDEX_RESPONSE
+
+
+@app.get("/healthz")
+def healthz() -> Dict[str, Any]:
+    """Report liveness along with basic connection metrics.
+
+    The status is ``degraded`` when a configured pub/sub backend is no
+    longer delivering messages from other workers.
+    """
+    pubsub = _pubsub_state()
+    return {
+        "status": "degraded" if pubsub == "disconnected" else "ok",
+        "pubsub": pubsub,
+        "clients": len(registry),
+        "max_clients": MAX_CLIENTS,
+        "dropped_messages": registry.dropped_messages,
+        "evicted_clients": registry.evicted_clients,
+    }
+
+
+async def _publish(
+    channel: str, text: str, exclude: Optional[WebSocket] = None
+) -> None:
+    """Deliver ``text`` to local clients and publish it to other workers.
+
+    Local clients are served straight from the registry; the copy sent
+    on ``channel`` is tagged with this worker's id so that ``_relay``
+    only forwards it on the other workers.  Nothing is published when
+    no backend is configured.  If publishing fails, the error is logged
+    and local delivery still stands.
+    """
+    registry.broadcast(text, exclude=exclude)
+    if broadcast is None:
+        return
+    envelope = _dumps({"origin": _WORKER_ID, "text": text})
+    try:
+        await broadcast.publish(channel, envelope)
+    except Exception:
+        logger.exception("Failed to publish message on %r", channel)
+
+
+async def _relay(backend: Broadcast, channel: str) -> None:
+    """Forward messages published by other workers to local clients.
+
+    Events that are not a well-formed envelope are logged and skipped
+    so that one stray message cannot stop the relay.
+    """
+    async with backend.subscribe(channel) as subscriber:
+        while True:
+            event = await subscriber.get()
+            try:
+                envelope = _loads(event.message)
+                origin = envelope["origin"]
+                text = envelope["text"]
+                if not isinstance(text, str):
+                    raise TypeError("envelope text is not a string")
+            except (TypeError, ValueError, KeyError):
+                logger.warning("Ignoring malformed message on %r", channel)
+                continue
+            if origin != _WORKER_ID:
+                registry.broadcast(text)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
     """Handle incoming WebSocket connections.
 
-    Newly connected clients are added to the global list.  Incoming
-    messages are inspected: commands prefixed with ``/device`` are
-    processed via the device simulator and the result is sent back to
-    the sender; other messages are broadcast to every other connected
-    client.  When a client disconnects, it is removed from the list.
+    Newly connected clients are added to the client registry, or
+    closed with code 1013 if ``MAX_CLIENTS`` are already connected.
+    Incoming messages are inspected: commands prefixed with ``/device``
+    are processed via the device simulator and the result is sent back
+    to the sender; other messages are queued for every other connected
+    client.  When a client disconnects, it is removed from the
+    registry.  All outgoing messages, including device replies, go
+    through the client's queue so only its sender task writes to the
+    socket.
     """
     await websocket.accept()
-    connected_clients.append(websocket)
+    if len(registry) >= MAX_CLIENTS:
+        await websocket.close(code=SERVER_FULL_CLOSE_CODE)
+        return
+    registry.add(websocket)
     try:
         while True:
             data = await websocket.receive_text()
-            if data.strip().lower().startswith("/device"):
+            # Only messages starting with the prefix's first character pay
+            # for the case-insensitive prefix check; plain chat is never
+            # lowercased
+            stripped = data.lstrip()
+            if (
+                stripped.startswith(_COMMAND_LEAD)
+                and stripped[:COMMAND_PREFIX_LEN].lower() == COMMAND_PREFIX
+            ):
                 # Send the command to the device simulator and respond
-                response = DeviceSimulator.handle_command(data)
-                await websocket.send_text(f"Device ➤ {response}")
+                cmd = stripped[COMMAND_PREFIX_LEN:].strip().lower()
+                response = DeviceSimulator.handle_command_normalised(cmd)
+                await registry.send(websocket, _DEVICE_PREFIX + response)
             else:
                 # Broadcast the message to all other connected clients
-                broadcast_text = f"User ➤ {data}"
-                for client in connected_clients:
-                    if client is not websocket:
-                        try:
-                            await client.send_text(broadcast_text)
-                        except WebSocketDisconnect:
-                            # Remove clients that have closed unexpectedly
-                            if client in connected_clients:
-                                connected_clients.remove(client)
+                broadcast_text = _USER_PREFIX + data
+                await _publish(_CHAT_CHANNEL, broadcast_text, exclude=websocket)
     except WebSocketDisconnect:
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
+        pass
+    finally:
+        registry.discard(websocket)
+
 
+async def device_sensor_readings(events: asyncio.Queue[int]) -> None:
+    """Background task to periodically produce sensor data.
+
+    Every ``SENSOR_INTERVAL`` seconds this coroutine generates a random
+    integer and queues it as a sensor reading for
+    ``device_sensor_broadcast``.  Ticks are scheduled against fixed
+    deadlines on the event loop clock, so the cadence does not drift
+    when the loop is busy; if the loop falls behind by more than a
+    period, the missed ticks are skipped.  In a real application this
+    function would interface with actual device hardware or other data
+    sources, possibly at a much higher rate.
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while True:
+        next_tick += SENSOR_INTERVAL
+        delay = next_tick - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            next_tick = loop.time()
+        events.put_nowait(_randint(0, 100))
 
-async def device_sensor_broadcast() -> None:
-    """Background task to periodically emit sensor data to clients.
 
-    Every 10 seconds this coroutine generates a random integer and
-    broadcasts it as a sensor reading to all connected clients.  In a
-    real application this function would interface with actual device
-    hardware or other data sources.
+async def device_sensor_broadcast(events: asyncio.Queue[int]) -> None:
+    """Background task to emit batches of sensor data to clients.
+
+    Readings arriving within ``SENSOR_BATCH_WINDOW`` seconds of the
+    first one in a batch are coalesced and broadcast to all connected
+    clients as a single JSON frame of the form ``{"sensors": [...]}``,
+    so a burst of readings costs one message per client rather than
+    one per reading.
     """
+    loop = asyncio.get_running_loop()
     while True:
-        await asyncio.sleep(10)
-        sensor_value = random.randint(0, 100)
-        message = f"Sensor reading: {sensor_value}"
-        for client in list(connected_clients):
+        batch = [await events.get()]
+        deadline = loop.time() + SENSOR_BATCH_WINDOW
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
             try:
-                await client.send_text(message)
-            except WebSocketDisconnect:
-                if client in connected_clients:
-                    connected_clients.remove(client)
+                batch.append(await asyncio.wait_for(events.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Every worker runs its own simulated device, so readings are
+        # only sent to this worker's clients; publishing them would give
+        # each client one copy per worker
+        registry.broadcast(_dumps({"sensors": batch}))
+
+
+def run(host: str = "127.0.0.1", port: int = 8000) -> None:
+    """Serve the app with Uvicorn and permessage-deflate enabled.
+
+    Uvicorn already enables compression by default.  Its ``auto``
+    WebSocket setting, however, falls back to ``wsproto``, which
+    cannot compress, when the ``websockets`` package is missing.
+    Pinning the ``websockets`` implementation turns that silent
+    fallback into a startup error, and ``ws_per_message_deflate`` is
+    passed to state the intent.  The event loop and HTTP parser are
+    left on Uvicorn's ``auto`` setting, which uses uvloop and httptools
+    when they are installed.
+    """
+    import uvicorn
+
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        ws="websockets",
+        ws_per_message_deflate=True,
+    )
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
-    """Launch background tasks on server start."""
-    # Schedule the periodic sensor broadcast
-    asyncio.create_task(device_sensor_broadcast())
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,169 @@
+"""Connected client bookkeeping for ZinChat.
+
+This module defines ``ClientRegistry``, which tracks every open
+WebSocket together with a bounded outgoing message queue.  Each client
+has a long-lived sender task that drains its own queue, so producers
+such as the chat handler or the sensor broadcaster only enqueue a
+message once per recipient and never wait on a slow connection.  When
+a client's queue is full, new messages for that client are dropped
+rather than buffered without limit, and a client that takes too long
+to accept a single message is disconnected.
+
+Queues hold ready-made ASGI ``websocket.send`` messages.  A broadcast
+builds its message once and every recipient's queue shares that same
+object, so fanning out to many clients costs no per-client formatting.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.types import Message
+
+# Number of pending outgoing messages buffered per client
+DEFAULT_QUEUE_SIZE = 64
+
+# Seconds a single send may take before the client is disconnected
+DEFAULT_SEND_TIMEOUT = 2.0
+
+# Close code sent to clients evicted for being too slow (policy violation)
+SLOW_CLIENT_CLOSE_CODE = 1008
+
+# Close code sent when delivery to a client fails unexpectedly
+SERVER_ERROR_CLOSE_CODE = 1011
+
+logger = logging.getLogger(__name__)
+
+
+def _text_message(text: str) -> Message:
+    """Build the ASGI message that sends ``text`` as a text frame."""
+    return {"type": "websocket.send", "text": text}
+
+
+class ClientRegistry:
+    """Set of connected clients, each paired with an outgoing queue.
+
+    Clients are registered with ``add`` after the WebSocket handshake
+    and removed with ``discard`` when the connection ends.  Messages
+    are delivered by a per-client sender task, which keeps all writes to
+    a given socket on a single task and preserves their order.
+
+    ``dropped_messages`` and ``evicted_clients`` count broadcasts lost
+    to full queues and clients closed for exceeding the send timeout.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        send_timeout: float = DEFAULT_SEND_TIMEOUT,
+    ) -> None:
+        self._queue_size = queue_size
+        self._send_timeout = send_timeout
+        self.dropped_messages = 0
+        self.evicted_clients = 0
+        self._queues: Dict[WebSocket, asyncio.Queue[Message]] = {}
+        self._senders: Dict[WebSocket, asyncio.Task[None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def __contains__(self, websocket: object) -> bool:
+        return websocket in self._queues
+
+    def add(self, websocket: WebSocket) -> None:
+        """Register ``websocket`` and start its sender task."""
+        queue: asyncio.Queue[Message] = asyncio.Queue(maxsize=self._queue_size)
+        self._queues[websocket] = queue
+        self._senders[websocket] = asyncio.create_task(
+            self._sender(websocket, queue)
+        )
+
+    def discard(self, websocket: WebSocket) -> None:
+        """Unregister ``websocket`` if present and stop its sender task."""
+        task = self._unregister(websocket)
+        if task is not None:
+            task.cancel()
+
+    def _unregister(self, websocket: WebSocket) -> Optional[asyncio.Task[None]]:
+        """Forget ``websocket`` and return its sender task, if any.
+
+        The client's queue is emptied so that a producer blocked in
+        ``send`` on a full queue is released instead of waiting forever
+        for a sender that no longer exists.
+        """
+        queue = self._queues.pop(websocket, None)
+        if queue is not None:
+            with contextlib.suppress(asyncio.QueueEmpty):
+                while True:
+                    queue.get_nowait()
+        return self._senders.pop(websocket, None)
+
+    async def send(self, websocket: WebSocket, message: str) -> None:
+        """Queue ``message`` for a single client.
+
+        Unlike ``broadcast`` this waits for room in the queue, so a
+        client that floods the server with requests is slowed down
+        instead of losing its own replies.  If the client is
+        unregistered while this waits, the message is discarded.
+        """
+        queue = self._queues.get(websocket)
+        if queue is not None:
+            await queue.put(_text_message(message))
+
+    def broadcast(self, message: str, exclude: Optional[WebSocket] = None) -> None:
+        """Queue ``message`` for every client except ``exclude``.
+
+        Clients whose queue is already full miss this message; their
+        connection is left open.
+        """
+        # Shared by all recipients; the server only reads from it
+        frame = _text_message(message)
+        if exclude is None:
+            others = tuple(self._queues.values())
+        else:
+            others = tuple(
+                queue for websocket, queue in self._queues.items()
+                if websocket is not exclude
+            )
+        for queue in others:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self.dropped_messages += 1
+
+    async def _sender(
+        self, websocket: WebSocket, queue: asyncio.Queue[Message]
+    ) -> None:
+        """Deliver queued messages to ``websocket`` until it goes away.
+
+        Whenever delivery stops, other than through ``discard``, the
+        client is unregistered immediately.  Its socket is closed
+        unless it is already gone, so the client neither keeps a slot
+        nor stays connected without receiving anything.
+        """
+        close_code: Optional[int] = None
+        try:
+            while True:
+                message = await queue.get()
+                await asyncio.wait_for(
+                    websocket.send(message), timeout=self._send_timeout
+                )
+        except asyncio.TimeoutError:
+            self.evicted_clients += 1
+            close_code = SLOW_CLIENT_CLOSE_CODE
+        except (WebSocketDisconnect, RuntimeError):
+            # Starlette raises RuntimeError when sending on a socket
+            # that has already been closed
+            pass
+        except Exception:
+            logger.exception("Failed to deliver a message to a client")
+            close_code = SERVER_ERROR_CLOSE_CODE
+        self._unregister(websocket)
+        if close_code is not None:
+            with contextlib.suppress(Exception):
+                await websocket.close(code=close_code)